@@ -1,22 +1,32 @@
 import logging
+from emerge_logging import setup_logging
 from telegram.ext import Updater, CommandHandler, CallbackContext
-from telegram import Update
-from telegram.constants import ParseMode
+from telegram import Update, ParseMode
 import os
-import supabase
+import threading
 from datetime import datetime
 
 # Configure logging
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+setup_logging(fmt='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Supabase Client
+# Supabase Client (created on first use so importing needs no credentials)
 SUPABASE_URL = os.getenv('SUPABASE_URL')
 SUPABASE_KEY = os.getenv('SUPABASE_KEY')
-supabase_client = supabase.create_client(SUPABASE_URL, SUPABASE_KEY)
+_supabase_client = None
+_supabase_lock = threading.Lock()
+
+def get_supabase():
+    """Return the shared Supabase client, creating it on first call"""
+    global _supabase_client
+    if _supabase_client is None:
+        with _supabase_lock:
+            if _supabase_client is None:
+                import supabase
+                if not SUPABASE_URL or not SUPABASE_KEY:
+                    raise ValueError("SUPABASE_URL / SUPABASE_KEY environment variables not set!")
+                _supabase_client = supabase.create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase_client
 
 class AdminBot:
     def __init__(self):
@@ -31,23 +41,23 @@ class AdminBot:
     def is_admin(self, user_id: int) -> bool:
         """Check if user is admin from Supabase"""
         try:
-            result = supabase_client.table('admins').select('*').eq('telegram_id', user_id).execute()
+            result = get_supabase().table('admins').select('*').eq('telegram_id', user_id).execute()
             return len(result.data) > 0
         except Exception as e:
-            logger.error(f"Error checking admin status: {e}")
+            logger.error("Error checking admin status: %s", e)
             return False
 
     def log_admin_action(self, action: str, admin_id: int, details: str = ""):
         """Log admin actions to Supabase"""
         try:
-            supabase_client.table('admin_logs').insert({
+            get_supabase().table('admin_logs').insert({
                 'admin_id': admin_id,
                 'action': action,
                 'details': details,
                 'timestamp': datetime.utcnow().isoformat()
             }).execute()
         except Exception as e:
-            logger.error(f"Error logging admin action: {e}")
+            logger.error("Error logging admin action: %s", e)
 
     def setup_handlers(self):
         """Setup all admin command handlers"""
@@ -65,7 +75,7 @@ class AdminBot:
         
         try:
             # Get pending RSVPs from Supabase
-            result = supabase_client.table('rsvps').select('*, users(*)').eq('status', 'pending').execute()
+            result = get_supabase().table('rsvps').select('*, users(*)').eq('status', 'pending').execute()
             pending_rsvps = result.data
             
             if not pending_rsvps:
@@ -85,7 +95,7 @@ class AdminBot:
             self.log_admin_action('viewed_rsvps', update.effective_user.id)
             
         except Exception as e:
-            logger.error(f"Error fetching RSVPs: {e}")
+            logger.error("Error fetching RSVPs: %s", e)
             update.message.reply_text("❌ Error fetching RSVPs. Check logs.")
 
     def approve_command(self, update: Update, context: CallbackContext):
@@ -101,10 +111,10 @@ class AdminBot:
         user_id = context.args[0]
         try:
             # Update RSVP status in Supabase
-            supabase_client.table('rsvps').update({'status': 'approved'}).eq('user_id', user_id).execute()
+            get_supabase().table('rsvps').update({'status': 'approved'}).eq('user_id', user_id).execute()
             
             # Notify user
-            user_result = supabase_client.table('users').select('telegram_id').eq('id', user_id).execute()
+            user_result = get_supabase().table('users').select('telegram_id').eq('id', user_id).execute()
             if user_result.data:
                 telegram_id = user_result.data[0]['telegram_id']
                 context.bot.send_message(telegram_id, "🎉 Your RSVP has been approved!")
@@ -113,7 +123,7 @@ class AdminBot:
             self.log_admin_action('approved_rsvp', update.effective_user.id, f"user_id: {user_id}")
             
         except Exception as e:
-            logger.error(f"Error approving RSVP: {e}")
+            logger.error("Error approving RSVP: %s", e)
             update.message.reply_text("❌ Error approving RSVP.")
 
     def deny_command(self, update: Update, context: CallbackContext):
@@ -129,11 +139,11 @@ class AdminBot:
         user_id = context.args[0]
         try:
             # Update RSVP status
-            supabase_client.table('rsvps').update({'status': 'denied'}).eq('user_id', user_id).execute()
+            get_supabase().table('rsvps').update({'status': 'denied'}).eq('user_id', user_id).execute()
             
             # Notify user with optional reason
             reason = " ".join(context.args[1:]) if len(context.args) > 1 else "No reason provided"
-            user_result = supabase_client.table('users').select('telegram_id').eq('id', user_id).execute()
+            user_result = get_supabase().table('users').select('telegram_id').eq('id', user_id).execute()
             if user_result.data:
                 telegram_id = user_result.data[0]['telegram_id']
                 context.bot.send_message(telegram_id, f"❌ Your RSVP was denied. Reason: {reason}")
@@ -142,7 +152,7 @@ class AdminBot:
             self.log_admin_action('denied_rsvp', update.effective_user.id, f"user_id: {user_id}, reason: {reason}")
             
         except Exception as e:
-            logger.error(f"Error denying RSVP: {e}")
+            logger.error("Error denying RSVP: %s", e)
             update.message.reply_text("❌ Error denying RSVP.")
 
     def broadcast_command(self, update: Update, context: CallbackContext):
@@ -158,7 +168,7 @@ class AdminBot:
         message = " ".join(context.args)
         try:
             # Get all users from Supabase
-            users_result = supabase_client.table('users').select('telegram_id').execute()
+            users_result = get_supabase().table('users').select('telegram_id').execute()
             users = users_result.data
             
             success_count = 0
@@ -167,13 +177,13 @@ class AdminBot:
                     context.bot.send_message(user['telegram_id'], f"📢 Announcement:\n\n{message}")
                     success_count += 1
                 except Exception as e:
-                    logger.warning(f"Failed to send to user {user['telegram_id']}: {e}")
+                    logger.warning("Failed to send to user %s: %s", user['telegram_id'], e)
             
             update.message.reply_text(f"📢 Broadcast sent to {success_count}/{len(users)} users")
             self.log_admin_action('sent_broadcast', update.effective_user.id, f"reach: {success_count}/{len(users)}")
             
         except Exception as e:
-            logger.error(f"Error in broadcast: {e}")
+            logger.error("Error in broadcast: %s", e)
             update.message.reply_text("❌ Error sending broadcast.")
 
     def admin_panel(self, update: Update, context: CallbackContext):
@@ -211,5 +221,5 @@ if __name__ == '__main__':
         bot = AdminBot()
         bot.start()
     except Exception as e:
-        logger.error(f"Failed to start bot: {e}")
+        logger.error("Failed to start bot: %s", e)
         raise
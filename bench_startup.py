@@ -0,0 +1,64 @@
+# bench_startup.py
+"""
+Startup-time benchmark for both bots.
+  python bench_startup.py                 # cold import time, no credentials
+  python bench_startup.py --ready-url http://localhost:5050/readyz
+                                          # + seconds until a running bot is ready
+Each import runs in a fresh interpreter with BOT_TOKEN / SUPABASE_* unset,
+so it also checks that the modules import without credentials or network.
+"""
+
+import os, sys, time, argparse, statistics, subprocess, urllib.request, urllib.error
+
+MODULES = ["emerge_bot", "admin_bot"]
+CREDENTIAL_VARS = ["BOT_TOKEN", "TELEGRAM_BOT_TOKEN", "SUPABASE_URL", "SUPABASE_KEY"]
+
+
+def import_time(module: str, runs: int) -> list:
+    env = {k: v for k, v in os.environ.items() if k not in CREDENTIAL_VARS}
+    here = os.path.dirname(os.path.abspath(__file__))
+    code = (
+        "import time; t0 = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - t0)"
+    )
+    out = []
+    for _ in range(runs):
+        p = subprocess.run([sys.executable, "-c", code], cwd=here, env=env,
+                           capture_output=True, text=True)
+        if p.returncode != 0:
+            raise SystemExit(f"import {module} failed:\n{p.stderr.strip()}")
+        out.append(float(p.stdout.strip().splitlines()[-1]))
+    return out
+
+
+def time_to_ready(url: str, timeout: float) -> float:
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as r:
+                if r.status == 200:
+                    return time.perf_counter() - t0
+        except (urllib.error.URLError, OSError):
+            pass
+        time.sleep(0.1)
+    raise SystemExit(f"{url} not ready after {timeout:.0f}s")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__,
+                                 formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--ready-url", help="poll this /readyz URL (start the bot right before)")
+    ap.add_argument("--timeout", type=float, default=60)
+    args = ap.parse_args()
+
+    for m in MODULES:
+        ts = import_time(m, args.runs)
+        print(f"import {m:<12} median {statistics.median(ts) * 1000:7.1f} ms"
+              f"  (min {min(ts) * 1000:.1f}, max {max(ts) * 1000:.1f}, n={len(ts)})")
+    if args.ready_url:
+        print(f"ready after {time_to_ready(args.ready_url, args.timeout):.2f} s  ({args.ready_url})")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,24 +7,34 @@
 # Optional URLs:
 #   TICKETS_URL, SHOP_URL, MUSIC_URL, IDEAS_URL, PROMOS_URL, SPECIAL_URL,
 #   SUBMIT_URL, ORDER_URL, FAQ_URL, SUPPORT_URL, DONATE_URL, TERMS_URL
+# Optional runtime:
+#   GET /healthz = liveness, GET /readyz = ready to serve (see bench_startup.py)
+#   LOG_FORMAT=text|json, LOG_PAYLOAD_SAMPLE=0.1 (see emerge_logging.py)
+#   OFFSET_FILE=.emerge_offset, CATCHUP=1, CATCHUP_WORKERS=8, BOT_POOL_SIZE=16
+#   FLOOD_USER_RATE=0.5, FLOOD_USER_BURST=4, FLOOD_CHAT_RATE=2, FLOOD_CHAT_BURST=10,
+#   DUP_CALLBACK_WINDOW=5
+#   INLINE_CACHE_TIME=3600  (inline mode must be enabled via @BotFather /setinline)
+#   STATE_FILE=.emerge_state.json, SHUTDOWN_DEADLINE=10
+#   ADMIN_NOTIFY=immediate|digest, ADMIN_DIGEST_INTERVAL=300
 
-import os, logging, threading, time
+import os, json, queue, signal, logging, threading, time, functools
+from collections import Counter
 from typing import Dict, Any, Optional, List
 
 from flask import Flask, request
 from telegram import (
-    Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup, TelegramError, ParseMode
-)
-from telegram.ext import (
-    Dispatcher, CommandHandler, MessageHandler, CallbackQueryHandler, Filters
+    Bot, Update, InlineKeyboardButton, InlineKeyboardMarkup, TelegramError, ParseMode,
+    InlineQueryResultArticle, InputTextMessageContent
 )
+from telegram.error import NetworkError, TimedOut, BadRequest
+from telegram.utils.helpers import escape_markdown
+
+from emerge_logging import setup_logging, sample_payload, Payload, elapsed_ms, JSON_OUTPUT
 
 # -------------------------
 # Config
 # -------------------------
 TOKEN = (os.environ.get("BOT_TOKEN") or "").strip()
-if not TOKEN:
-    raise SystemExit("BOT_TOKEN missing")
 
 PORT = int(os.environ.get("PORT", "5050"))
 ADMIN_IDS = {
@@ -47,6 +57,32 @@ URLS = {
     "terms":    os.environ.get("TERMS_URL",    "https://emergeglobally.com/terms"),
 }
 
+# Durable update offset + catch-up on restart
+OFFSET_FILE = os.environ.get("OFFSET_FILE", ".emerge_offset")
+CATCHUP_ENABLED = os.environ.get("CATCHUP", "1") != "0"
+CATCHUP_WORKERS = int(os.environ.get("CATCHUP_WORKERS", "8"))
+
+# HTTP connections shared by every thread that talks to Telegram
+BOT_POOL_SIZE = int(os.environ.get("BOT_POOL_SIZE", str(CATCHUP_WORKERS + 8)))
+
+# Inline mode (@bot tickets): answers are static, so let Telegram cache them
+INLINE_CACHE_TIME = int(os.environ.get("INLINE_CACHE_TIME", "3600"))
+
+# Graceful shutdown: state snapshot restored on next boot
+STATE_FILE = os.environ.get("STATE_FILE", ".emerge_state.json")
+SHUTDOWN_DEADLINE = float(os.environ.get("SHUTDOWN_DEADLINE", "10"))
+
+# Admin notifications: sent in the background, one by one or as periodic digests
+ADMIN_NOTIFY_MODE = os.environ.get("ADMIN_NOTIFY", "immediate").lower()
+ADMIN_DIGEST_INTERVAL = float(os.environ.get("ADMIN_DIGEST_INTERVAL", "300"))
+
+# Flood control: token buckets (tokens/sec, burst) per user and per chat
+FLOOD_USER_RATE  = float(os.environ.get("FLOOD_USER_RATE", "0.5"))
+FLOOD_USER_BURST = float(os.environ.get("FLOOD_USER_BURST", "4"))
+FLOOD_CHAT_RATE  = float(os.environ.get("FLOOD_CHAT_RATE", "2"))
+FLOOD_CHAT_BURST = float(os.environ.get("FLOOD_CHAT_BURST", "10"))
+DUP_CALLBACK_WINDOW = float(os.environ.get("DUP_CALLBACK_WINDOW", "5"))
+
 # Keywords shown on the main inline menu
 KEY_ROUTES = {
     "tickets":   "🎟 Tickets",
@@ -73,15 +109,15 @@ DESIGNER_BRANDS = [
 # In-memory store for Designer Portal onboarding (simple, survives per-process)
 designer_submissions: Dict[int, Dict[str, Any]] = {}
 
-# Flask & Telegram bot
+# Flask app; the Telegram Bot/Dispatcher are built lazily (get_bot / get_dp)
 app = Flask(__name__)
-bot = Bot(token=TOKEN)
-dp  = Dispatcher(bot, update_queue=None, workers=4, use_context=True)
+_bot: Optional[Bot] = None
+dp = None
+_init_lock = threading.Lock()
+_ready = threading.Event()  # set once polling is live (see /readyz)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s"
-)
+setup_logging()
+log = logging.getLogger("emerge")
 
 # -------------------------
 # Helpers
@@ -127,35 +163,306 @@ def dm_or_deeplink(context, user_id: int, text: str, route_hint: str,
                 pass
         return False
 
-def auto_delete(context, chat_id: int, message_id: int, delay: int = 15):
-    """Silently delete a message after `delay` seconds to keep groups tidy."""
+# (chat_id, message_id) -> wall-clock due time; snapshotted on shutdown
+pending_deletes: Dict[tuple, float] = {}
+_deletes_lock = threading.Lock()
+
+def _schedule_delete(b, chat_id: int, message_id: int, due: float):
+    key = (chat_id, message_id)
+    with _deletes_lock:
+        pending_deletes[key] = due
+
     def _delete():
-        time.sleep(delay)
+        time.sleep(max(0.0, due - time.time()))
+        with _deletes_lock:
+            if pending_deletes.pop(key, None) is None:
+                return  # already handed over to the snapshot
         try:
-            context.bot.delete_message(chat_id=chat_id, message_id=message_id)
+            b.delete_message(chat_id=chat_id, message_id=message_id)
         except Exception:
             pass
     threading.Thread(target=_delete, daemon=True).start()
 
+def auto_delete(context, chat_id: int, message_id: int, delay: int = 15):
+    """Silently delete a message after `delay` seconds to keep groups tidy."""
+    _schedule_delete(context.bot, chat_id, message_id, time.time() + delay)
+
+# -------------------------
+# Update offset (survives restarts)
+# -------------------------
+_offset_lock = threading.Lock()
+_last_update_id = 0
+_catching_up = threading.Event()  # shutdown waits for the current batch
+
+def load_offset() -> int:
+    """Last processed update_id from disk (0 if none yet)."""
+    try:
+        with open(OFFSET_FILE) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def save_offset(update_id: int, force: bool = False):
+    """Persist `update_id` atomically if it moves the offset forward (or `force`)."""
+    global _last_update_id
+    with _offset_lock:
+        if update_id <= _last_update_id and not force:
+            return
+        _last_update_id = update_id
+        tmp = OFFSET_FILE + ".tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(str(update_id))
+            os.replace(tmp, OFFSET_FILE)
+        except OSError as e:
+            log.warning("Could not persist offset %s: %s", update_id, e)
+
+def _dedupe_key(u: Update):
+    """Key for updates where only the newest one matters (menu taps, /menu, /start)."""
+    if u.callback_query:
+        q = u.callback_query
+        return ("cb", q.from_user.id, q.data)
+    m = u.message
+    if m and m.text and m.text.split()[0].lower().split("@")[0] in ("/menu", "/start"):
+        return ("cmd", m.chat_id, m.from_user.id if m.from_user else None, m.text.strip().lower())
+    return None
+
+def _lane_of(u: Update):
+    """Updates from the same user/chat must stay in order; lanes run in parallel."""
+    if u.effective_user:
+        return ("u", u.effective_user.id)
+    if u.effective_chat:
+        return ("c", u.effective_chat.id)
+    return ("x", u.update_id)
+
+def _fetch_backlog(b, offset: Optional[int], limit: int, attempts: int = 5):
+    """get_updates with backoff; None if Telegram stays unreachable."""
+    delay = 1
+    for i in range(attempts):
+        try:
+            return b.get_updates(offset=offset, limit=limit, timeout=0)
+        except TelegramError as e:
+            if i == attempts - 1:
+                break
+            log.warning("Catch-up fetch failed (%s), retrying in %ss", e, delay)
+            if _stop_event.wait(delay):
+                break
+            delay = min(delay * 2, 30)
+    return None
+
+def catch_up(d, batch_size: int = 100) -> int:
+    """
+    Replay updates queued while the bot was down, before live polling starts.
+    Fetches in large batches, drops stale duplicates (keeps the newest tap)
+    and processes per-user lanes in parallel. Returns the number processed.
+
+    The first fetch has no offset: Telegram already knows what was confirmed.
+    The saved offset is only a watermark for updates handled but not yet
+    confirmed; if every pending id is below it, ids were restarted by
+    Telegram and the watermark is reset.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    global _last_update_id
+    watermark = _last_update_id = load_offset()
+    offset: Optional[int] = None
+    processed = dropped = 0
+    _catching_up.set()
+    try:
+        with ThreadPoolExecutor(max_workers=CATCHUP_WORKERS) as pool:
+            while not _stop_event.is_set():
+                batch = _fetch_backlog(d.bot, offset, batch_size)
+                if batch is None:
+                    log.warning("⏩ Catch-up aborted (Telegram unreachable); live polling takes over")
+                    break
+                if not batch:
+                    break
+                if offset is None and batch[-1].update_id < watermark:
+                    log.info("⏩ Update ids restarted (%s < %s), resetting offset", batch[-1].update_id, watermark)
+                    watermark = 0
+                    save_offset(0, force=True)
+                newest: Dict[Any, int] = {}
+                for u in batch:
+                    k = _dedupe_key(u)
+                    if k:
+                        newest[k] = u.update_id
+                lanes: Dict[Any, List[Update]] = {}
+                for u in batch:
+                    if u.update_id <= watermark:
+                        continue  # handled before the restart, just not confirmed
+                    if u.inline_query:
+                        dropped += 1  # inline queries expire within seconds
+                        continue
+                    k = _dedupe_key(u)
+                    if k and newest[k] != u.update_id:
+                        dropped += 1
+                        continue
+                    lanes.setdefault(_lane_of(u), []).append(u)
+
+                def _run(lane):
+                    for u in lane:
+                        d.process_update(u)
+
+                list(pool.map(_run, lanes.values()))
+                processed += sum(len(lane) for lane in lanes.values())
+                save_offset(batch[-1].update_id)
+                offset = batch[-1].update_id + 1  # confirms this batch
+    finally:
+        _catching_up.clear()
+    if processed or dropped:
+        log.info("⏩ Catch-up done: %d processed, %d stale duplicates dropped", processed, dropped)
+    return processed
+
 def is_admin(user_id: int) -> bool:
     return user_id in ADMIN_IDS if ADMIN_IDS else False
 
+# -------------------------
+# Flood control (per-user / per-chat token buckets)
+# -------------------------
+_flood_lock = threading.Lock()
+_buckets: Dict[tuple, List[float]] = {}     # key -> [tokens, last_ts]
+_recent_taps: Dict[tuple, float] = {}       # (user_id, data) -> last tap ts
+flood_drops: Dict[str, int] = {"user": 0, "chat": 0, "dup_callback": 0}
+
+def _take(key: tuple, rate: float, burst: float, now: float) -> bool:
+    b = _buckets.get(key)
+    if b is None:
+        b = _buckets[key] = [burst, now]
+    b[0] = min(burst, b[0] + (now - b[1]) * rate)
+    b[1] = now
+    if b[0] < 1:
+        return False
+    b[0] -= 1
+    return True
+
+def _prune(now: float):
+    """Forget idle buckets/taps so memory stays bounded."""
+    for k in [k for k, b in _buckets.items() if now - b[1] > 600]:
+        del _buckets[k]
+    for k in [k for k, t in _recent_taps.items() if now - t > DUP_CALLBACK_WINDOW]:
+        del _recent_taps[k]
+
+def flood_ok(user_id: Optional[int], chat_id: Optional[int]) -> bool:
+    """True if both the user's and the chat's bucket still have a token."""
+    now = time.monotonic()
+    with _flood_lock:
+        if len(_buckets) > 10000:
+            _prune(now)
+        if user_id is not None and not _take(("u", user_id), FLOOD_USER_RATE, FLOOD_USER_BURST, now):
+            flood_drops["user"] += 1
+            return False
+        if chat_id is not None and chat_id != user_id \
+                and not _take(("c", chat_id), FLOOD_CHAT_RATE, FLOOD_CHAT_BURST, now):
+            flood_drops["chat"] += 1
+            return False
+    return True
+
+def is_dup_tap(user_id: int, data: str) -> bool:
+    """Same button tapped by the same user within DUP_CALLBACK_WINDOW seconds."""
+    now = time.monotonic()
+    with _flood_lock:
+        if len(_recent_taps) > 10000:
+            _prune(now)
+        last = _recent_taps.get((user_id, data))
+        _recent_taps[(user_id, data)] = now
+        if last is not None and now - last < DUP_CALLBACK_WINDOW:
+            flood_drops["dup_callback"] += 1
+            return True
+    return False
+
+# -------------------------
+# Admin notifier (background; immediate or digest)
+# -------------------------
+_notify_q: "queue.Queue[str]" = queue.Queue()
+admin_digest: Dict[int, List[List[str]]] = {}  # admin id -> [[kind, text], ...]
+_digest_lock = threading.Lock()
+_notifier_lock = threading.Lock()
+_notifier: Optional[threading.Thread] = None
+
+def notify_admins(kind: str, text: str):
+    """Queue an admin event (submission / rsvp / failure); never blocks the caller."""
+    if not ADMIN_IDS:
+        return
+    _start_notifier()
+    if ADMIN_NOTIFY_MODE == "digest":
+        with _digest_lock:
+            for aid in ADMIN_IDS:
+                admin_digest.setdefault(aid, []).append([kind, text])
+    else:
+        _notify_q.put(text)
+
+def _send_admin(aid: int, text: str):
+    b = get_bot()
+    try:
+        b.send_message(chat_id=aid, text=text, parse_mode=ParseMode.MARKDOWN)
+    except BadRequest as e:
+        # broken markup must not cost the admin the message: resend as plain text
+        log.warning("Admin notify to %s rejected (%s), resending as plain text", aid, e)
+        try:
+            b.send_message(chat_id=aid, text=text)
+        except Exception as e2:
+            log.warning("Admin notify to %s failed: %s", aid, e2)
+    except Exception as e:
+        log.warning("Admin notify to %s failed: %s", aid, e)
+
+def _render_digest(events: List[List[str]], limit: int = 4000) -> str:
+    """Digest text, cut at event boundaries so markup pairs stay intact."""
+    counts = Counter(kind for kind, _ in events)
+    text = "🗂 **Admin digest** — " + ", ".join(f"{n} {k}" for k, n in counts.items())
+    for i, (_, t) in enumerate(events):
+        more = f"\n\n…and {len(events) - i} more"
+        if len(text) + 2 + len(t) + len(more) > limit:
+            return text + more
+        text += "\n\n" + t
+    return text
+
+def flush_digest():
+    """Send each admin one message with everything queued for them."""
+    with _digest_lock:
+        pending = dict(admin_digest)
+        admin_digest.clear()
+    for aid, events in pending.items():
+        if events:
+            _send_admin(aid, _render_digest(events))
+
+def _notifier_loop():
+    next_flush = time.monotonic() + ADMIN_DIGEST_INTERVAL
+    while True:
+        if ADMIN_NOTIFY_MODE == "digest":
+            time.sleep(max(0.0, next_flush - time.monotonic()))
+            flush_digest()
+            next_flush += ADMIN_DIGEST_INTERVAL
+            continue
+        text = _notify_q.get()
+        for aid in ADMIN_IDS:
+            _send_admin(aid, text)
+        _notify_q.task_done()
+
+def _start_notifier():
+    global _notifier
+    if _notifier is None:
+        with _notifier_lock:
+            if _notifier is None:
+                _notifier = threading.Thread(target=_notifier_loop, name="admin-notifier", daemon=True)
+                _notifier.start()
+
 # -------------------------
 # Rich replies per route (DM-first)
 # -------------------------
-def dm_block_for(route: str) -> str:
+def dm_block_for(route: str, inline: bool = False) -> str:
+    """Reply text for a route. `inline=True` drops lines that only make sense in a DM."""
     if route == "tickets":
         return (
             f"🎟 **Tickets — American Invasion**\n"
             f"• View availability & buy → {URLS['tickets']}\n"
             f"• Accepted payments: **Telebirr, M-Pesa, Card, PayPal, Cash, Bank Transfer**\n"
-            f"• Refund/transfer: subject to event policy.\n"
-            f"_If you haven’t started a private chat yet, tap the button and press Start._"
+            f"• Refund/transfer: subject to event policy."
+            + ("" if inline else
+               "\n_If you haven’t started a private chat yet, tap the button and press Start._")
         )
     if route == "shop":
         return (
-            f"🛒 **Shop — Exclusive drops**\n"
-            f"Browse looks & sizes. Reply with your picks and size.\n"
+            "🛒 **Shop — Exclusive drops**\n"
+            + ("Browse looks & sizes.\n" if inline else "Browse looks & sizes. Reply with your picks and size.\n") +
             f"• Shop now → {URLS['shop']}\n"
             f"• Payments: Telebirr, M-Pesa, Card, PayPal, Cash, Bank Transfer\n"
             f"• Delivery options may vary by item."
@@ -165,13 +472,15 @@ def dm_block_for(route: str) -> str:
         brands = "\n".join([f"• {b}" for b in DESIGNER_BRANDS])
         return (
             "👗 **Designers — Browse brands**\n"
-            f"{brands}\n\n"
-            "Reply with the designer you want to view, and I’ll send their current looks."
+            f"{brands}"
+            + ("" if inline else
+               "\n\nReply with the designer you want to view, and I’ll send their current looks.")
         )
     if route == "support":
         return (
-            f"📞 **Support**\n"
-            f"Reply with your issue (order # if you have it), or use the form:\n"
+            "📞 **Support**\n"
+            + ("Use the form (include your order # if you have it):\n" if inline else
+               "Reply with your issue (order # if you have it), or use the form:\n") +
             f"{URLS['support']}\n"
             f"_We reply within 24h._"
         )
@@ -182,7 +491,8 @@ def dm_block_for(route: str) -> str:
             "2) Delivery: varies by item/city; ask support if unsure.\n"
             "3) Returns: apparel returns subject to policy.\n"
             "4) Sizing: DM your measurements; we’ll help.\n"
-            "5) Support: reply here or use the form.\n"
+            + ("5) Support: use the support form.\n" if inline else
+               "5) Support: reply here or use the form.\n") +
             f"Full FAQ → {URLS['faq']}"
         )
     if route == "terms":
@@ -199,7 +509,8 @@ def dm_block_for(route: str) -> str:
     if route == "special":
         return (
             "⭐ **Special Order**\n"
-            "Reply with a reference photo, size, budget, and timeline.\n"
+            + ("Send us a reference photo, size, budget, and timeline.\n" if inline else
+               "Reply with a reference photo, size, budget, and timeline.\n") +
             "We’ll confirm details within 24–48h."
         )
     if route == "submit":
@@ -222,6 +533,71 @@ def dm_block_for(route: str) -> str:
         return "🎮 **Emerge Games** — Coming soon. Stay tuned!"
     return "ℹ️ More info coming soon."
 
+# -------------------------
+# Inline mode (precomputed results + prefix index)
+# -------------------------
+# FAQ entries also served one-by-one inline
+FAQ_ITEMS = [
+    ("Tickets", "Check availability & rules on the ticket page."),
+    ("Delivery", "Varies by item/city; ask support if unsure."),
+    ("Returns", "Apparel returns subject to policy."),
+    ("Sizing", "DM your measurements; we’ll help."),
+    ("Support", f"Use the support form → {URLS['support']}"),
+]
+
+_inline_results: List[InlineQueryResultArticle] = []
+_inline_prefixes: Dict[str, set] = {}
+_inline_lock = threading.Lock()
+
+def _inline_article(rid: str, title: str, description: str, text: str) -> InlineQueryResultArticle:
+    return InlineQueryResultArticle(
+        id=rid,
+        title=title,
+        description=description,
+        input_message_content=InputTextMessageContent(text, parse_mode=ParseMode.MARKDOWN),
+    )
+
+def _build_inline_index():
+    """Render every route/FAQ/designer answer once and index all word prefixes."""
+    entries = []  # (article, search words)
+    for route, label in KEY_ROUTES.items():
+        text = dm_block_for(route, inline=True)
+        desc = text.split("\n", 1)[-1].replace("*", "").replace("_", "")[:80]
+        entries.append((_inline_article(f"r:{route}", label, desc, text), f"{route} {label}"))
+    for i, (topic, answer) in enumerate(FAQ_ITEMS):
+        text = f"📖 **FAQ — {topic}**\n{answer}\nFull FAQ → {URLS['faq']}"
+        entries.append((_inline_article(f"f:{i}", f"📖 FAQ: {topic}", answer, text), f"faq {topic}"))
+    for i, brand in enumerate(DESIGNER_BRANDS):
+        text = f"👗 **{brand}**\nBrowse the brand and current looks → {URLS['shop']}"
+        entries.append((_inline_article(f"d:{i}", f"👗 {brand}", "Emerge designer", text), f"designers designer {brand}"))
+
+    prefixes: Dict[str, set] = {}
+    for idx, (_, words) in enumerate(entries):
+        for w in words.lower().replace("/", " ").split():
+            w = "".join(ch for ch in w if ch.isalnum())
+            for n in range(1, len(w) + 1):
+                prefixes.setdefault(w[:n], set()).add(idx)
+    return [a for a, _ in entries], prefixes
+
+def inline_search(query: str) -> List[InlineQueryResultArticle]:
+    """All results whose words start with every term of `query` (max 50)."""
+    global _inline_results, _inline_prefixes
+    if not _inline_results:
+        with _inline_lock:
+            if not _inline_results:
+                _inline_results, _inline_prefixes = _build_inline_index()
+    terms = ["".join(ch for ch in t if ch.isalnum()) for t in query.lower().split()]
+    terms = [t for t in terms if t]
+    if not terms:
+        return _inline_results[:len(KEY_ROUTES)]
+    hits = None
+    for t in terms:
+        ids = _inline_prefixes.get(t, set())
+        hits = ids if hits is None else hits & ids
+        if not hits:
+            return []
+    return [_inline_results[i] for i in sorted(hits)][:50]
+
 # -------------------------
 # Handlers
 # -------------------------
@@ -238,6 +614,8 @@ def start(update, context):
             "_This isn’t your ticket — watch DM for confirmations._"
         )
         context.bot.send_message(chat_id=chat.id, text=msg, parse_mode=ParseMode.MARKDOWN)
+        notify_admins("rsvp", f"🎟 **RSVP** — {escape_markdown(user.first_name)} (id {user.id}) "
+                              f"via {escape_markdown(args[0])}")
     context.bot.send_message(chat_id=chat.id, text="📌 Main Menu — choose an option:", reply_markup=main_menu_markup())
 
 def menu(update, context):
@@ -259,6 +637,7 @@ def on_text(update, context):
     msg = update.message
     chat = update.effective_chat
     txt  = (msg.text or "").lower().strip()
+    user_id = msg.from_user.id if msg.from_user else None
 
     if chat.type in ("group","supergroup"):
         matched = None
@@ -267,6 +646,9 @@ def on_text(update, context):
                 matched = key
                 break
         if matched:
+            # only route requests spend tokens; ordinary chatter is free
+            if not flood_ok(user_id, chat.id):
+                return
             # brief note in group + auto-delete
             try:
                 ack = context.bot.send_message(
@@ -289,7 +671,7 @@ def on_text(update, context):
             return
 
     # private default echo
-    if chat.type == "private":
+    if chat.type == "private" and flood_ok(user_id, chat.id):
         context.bot.send_message(chat_id=chat.id, text="Got it! Type /menu to browse options.")
 
 def on_callback(update, context):
@@ -297,7 +679,13 @@ def on_callback(update, context):
     data = (q.data or "").lower()
     user = update.effective_user
     chat = update.effective_chat
-    q.answer()
+    try:
+        q.answer()
+    except TelegramError:
+        pass  # query too old (e.g. replayed during catch-up) — still deliver the DM
+    # repeated taps / bursts: the answer above is all they get
+    if is_dup_tap(user.id, data) or not flood_ok(user.id, chat.id if chat else None):
+        return
     # DM-first for all menu buttons
     text = dm_block_for(data)
     if chat.type in ("group","supergroup"):
@@ -318,6 +706,14 @@ def on_callback(update, context):
     else:
         context.bot.send_message(chat_id=chat.id, text=text, parse_mode=ParseMode.MARKDOWN)
 
+def on_inline_query(update, context):
+    """`@bot tickets` → precomputed answers; Telegram caches them for everyone."""
+    q = update.inline_query
+    try:
+        q.answer(inline_search(q.query or ""), cache_time=INLINE_CACHE_TIME, is_personal=False)
+    except TelegramError:
+        pass
+
 # -------------------------
 # Designer Portal (command only, DM)
 # -------------------------
@@ -432,20 +828,16 @@ def designer_portal_flow(update, context):
         entry["payout"] = txt
         entry["state"] = "submitted"
 
-        # notify admin(s)
+        # notify admin(s) — queued first so a failed confirmation can't lose it
         summary = (
             "🆕 **Designer Submission**\n"
-            f"User: {user.first_name} (id {uid})\n"
-            f"Brand: {entry.get('brand')}\n"
-            f"Shipping: {entry.get('shipping')}\n"
-            f"Payout: {entry.get('payout')}\n"
+            f"User: {escape_markdown(user.first_name)} (id {uid})\n"
+            f"Brand: {escape_markdown(str(entry.get('brand')))}\n"
+            f"Shipping: {escape_markdown(str(entry.get('shipping')))}\n"
+            f"Payout: {escape_markdown(str(entry.get('payout')))}\n"
             f"Products: {len(entry.get('product_file_ids',[]))}\n"
         )
-        for aid in ADMIN_IDS:
-            try:
-                context.bot.send_message(chat_id=aid, text=summary, parse_mode=ParseMode.MARKDOWN)
-            except Exception:
-                pass
+        notify_admins("submission", summary)  # never blocks; sent in the background
 
         # confirmation to designer
         context.bot.send_message(
@@ -486,7 +878,10 @@ def on_admin_callback(update, context):
     q = update.callback_query
     user = update.effective_user
     chat = update.effective_chat
-    q.answer()
+    try:
+        q.answer()
+    except TelegramError:
+        pass  # query too old (e.g. replayed during catch-up) — still run the action
 
     if chat.type != "private" or not is_admin(user.id):
         return
@@ -520,22 +915,94 @@ def on_admin_callback(update, context):
 # -------------------------
 # Routes & Registration
 # -------------------------
+def _mark_processed(update, context):
+    """Runs last for every update so the offset only advances past handled ones."""
+    if _catching_up.is_set():
+        return  # lanes finish out of order; catch_up saves once the whole batch is done
+    save_offset(update.update_id)
+
+# per-handler lines only carry information in JSON; in text mode they are DEBUG
+_HANDLED_LEVEL = logging.INFO if JSON_OUTPUT else logging.DEBUG
+
+def _logged(fn):
+    """Wrap a handler so each call emits one structured line with its latency."""
+    @functools.wraps(fn)
+    def wrapper(update, context):
+        if not log.isEnabledFor(_HANDLED_LEVEL):
+            return fn(update, context)
+        t0 = time.perf_counter()
+        chat = update.effective_chat
+        fields = {"update_id": update.update_id, "chat_id": chat.id if chat else None,
+                  "handler": fn.__name__}
+        try:
+            return fn(update, context)
+        finally:
+            ms = elapsed_ms(t0)
+            log.log(_HANDLED_LEVEL, "handled %s (update %s, chat %s) in %.1f ms",
+                    fn.__name__, fields["update_id"], fields["chat_id"], ms,
+                    extra={**fields, "latency_ms": ms})
+    return wrapper
+
+def _on_error(update, context):
+    """Log handler failures; report only those tied to an update to admins."""
+    if update is None:
+        # polling errors (network blips, Conflict) come without an update
+        if isinstance(context.error, (NetworkError, TimedOut)):
+            log.warning("Polling error: %s", context.error)
+        else:
+            log.error("Dispatcher error: %s", context.error, exc_info=context.error)
+        return
+    log.error("Handler error: %s", context.error, exc_info=context.error)
+    update_id = update.update_id if isinstance(update, Update) else None
+    notify_admins("failure", f"⚠️ **Handler error** (update {update_id}): `{type(context.error).__name__}`")
+
 def _register_handlers(d):
     if getattr(d, "emg_handlers_registered", False):
         return
-    d.add_handler(CommandHandler("start", start))
-    d.add_handler(CommandHandler("menu",  menu))
-    d.add_handler(CommandHandler("admin", cmd_admin))
-    d.add_handler(CommandHandler("designer_portal", cmd_designer_portal))
-    d.add_handler(CallbackQueryHandler(on_admin_callback, pattern=r"^admin:"))
-    d.add_handler(CallbackQueryHandler(on_callback, pattern=r"^(?!admin:).+"))
-    d.add_handler(MessageHandler(Filters.status_update.new_chat_members, greet_new_member))
-    d.add_handler(MessageHandler(Filters.private & (Filters.text | Filters.photo | Filters.document), designer_portal_flow))
-    d.add_handler(MessageHandler(Filters.text & ~Filters.command, on_text))
+    from telegram.ext import (
+        CommandHandler, MessageHandler, CallbackQueryHandler, InlineQueryHandler,
+        TypeHandler, Filters
+    )
+    d.add_handler(CommandHandler("start", _logged(start)))
+    d.add_handler(CommandHandler("menu",  _logged(menu)))
+    d.add_handler(CommandHandler("admin", _logged(cmd_admin)))
+    d.add_handler(CommandHandler("designer_portal", _logged(cmd_designer_portal)))
+    d.add_handler(CallbackQueryHandler(_logged(on_admin_callback), pattern=r"^admin:"))
+    d.add_handler(CallbackQueryHandler(_logged(on_callback), pattern=r"^(?!admin:).+"))
+    d.add_handler(InlineQueryHandler(_logged(on_inline_query)))
+    d.add_handler(MessageHandler(Filters.status_update.new_chat_members, _logged(greet_new_member)))
+    d.add_handler(MessageHandler(Filters.private & (Filters.text | Filters.photo | Filters.document), _logged(designer_portal_flow)))
+    d.add_handler(MessageHandler(Filters.text & ~Filters.command, _logged(on_text)))
+    d.add_handler(TypeHandler(Update, _mark_processed), group=99)
+    d.add_error_handler(_on_error)
     d.emg_handlers_registered = True
 
-# initial registration on the global dp
-_register_handlers(dp)
+def get_bot() -> Bot:
+    """The shared Bot, created on first use (no network call)."""
+    global _bot
+    if _bot is None:
+        with _init_lock:
+            if _bot is None:
+                if not TOKEN:
+                    raise RuntimeError("BOT_TOKEN missing")
+                from telegram.utils.request import Request
+                # one pool serves the long poll, dispatcher workers, catch-up
+                # threads, delete timers and the admin notifier
+                _bot = Bot(token=TOKEN, request=Request(con_pool_size=BOT_POOL_SIZE))
+    return _bot
+
+def get_dp():
+    """Dispatcher for webhook updates, created and registered on first use."""
+    global dp
+    if dp is None:
+        b = get_bot()
+        with _init_lock:
+            if dp is None:
+                from telegram.ext import Dispatcher
+                d = Dispatcher(b, update_queue=None, workers=4, use_context=True)
+                _register_handlers(d)
+                dp = d
+    return dp
 
 # -------------------------
 # Flask endpoints
@@ -543,10 +1010,21 @@ _register_handlers(dp)
 # -------------------------
 @app.route("/tg", methods=["POST"])
 def tg_post():
+    global _inflight
+    if _stop_event.is_set():
+        return "draining", 503  # Telegram retries the webhook later
     data = request.get_json(force=True)
-    logging.info(f"📥 Incoming update: {data}")
-    update = Update.de_json(data, bot)
-    dp.process_update(update)
+    if sample_payload():
+        log.info("📥 Incoming update: %s", Payload(data))
+    d = get_dp()
+    update = Update.de_json(data, d.bot)
+    with _inflight_lock:
+        _inflight += 1
+    try:
+        d.process_update(update)
+    finally:
+        with _inflight_lock:
+            _inflight -= 1
     return "ok"
 
 @app.route("/tg", methods=["GET"])
@@ -555,12 +1033,118 @@ def tg_get():
 
 @app.route("/healthz", methods=["GET"])
 def healthz():
+    """Liveness: the process is up and serving HTTP."""
     return "ok"
 
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """Readiness: Telegram reachable, backlog replayed, polling live."""
+    if _ready.is_set() and not _stop_event.is_set():
+        return "ready"
+    return "starting", 503
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return {"flood_drops": dict(flood_drops)}
+
 @app.route("/", methods=["GET"])
 def root_ok():
     return "Emerge Bot Running"
 
+# -------------------------
+# Graceful drain + warm restart
+# -------------------------
+_updater = None
+_stop_event = threading.Event()
+_inflight = 0
+_inflight_lock = threading.Lock()
+
+def save_state():
+    """Write onboarding flows, pending deletions and unsent admin notifications to STATE_FILE (atomic)."""
+    with _deletes_lock:
+        deletes = [[c, m, due] for (c, m), due in pending_deletes.items()]
+    with _digest_lock:
+        digest = {str(k): v for k, v in admin_digest.items() if v}
+    notices: List[str] = []
+    while True:
+        try:
+            notices.append(_notify_q.get_nowait())
+        except queue.Empty:
+            break
+        _notify_q.task_done()
+    state = {
+        "saved_at": time.time(),
+        "designer_submissions": {str(k): v for k, v in designer_submissions.items()},
+        "pending_deletes": deletes,
+        "admin_digest": digest,
+        "admin_notices": notices,
+    }
+    tmp = STATE_FILE + ".tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, STATE_FILE)
+    except Exception:
+        for text in notices:
+            _notify_q.put(text)  # not saved: leave them for the notifier
+        raise
+    # only now hand the deletions over to the snapshot; sleeping timers become no-ops
+    with _deletes_lock:
+        for c, m, _ in deletes:
+            pending_deletes.pop((c, m), None)
+    log.info("💾 State saved: %d flows, %d pending deletes, %d admin notices",
+             len(designer_submissions), len(deletes), len(notices))
+
+def restore_state(b):
+    """Load the snapshot left by the previous process (consumed once)."""
+    try:
+        with open(STATE_FILE) as f:
+            state = json.load(f)
+        os.replace(STATE_FILE, STATE_FILE + ".restored")
+    except FileNotFoundError:
+        return
+    except (OSError, ValueError) as e:
+        log.warning("Could not restore state from %s: %s", STATE_FILE, e)
+        return
+    for k, v in (state.get("designer_submissions") or {}).items():
+        designer_submissions.setdefault(int(k), v)
+    deletes = state.get("pending_deletes") or []
+    for chat_id, message_id, due in deletes:
+        _schedule_delete(b, chat_id, message_id, due)
+    digest = state.get("admin_digest") or {}
+    if digest:
+        with _digest_lock:
+            for k, events in digest.items():
+                admin_digest.setdefault(int(k), []).extend(events)
+        _start_notifier()
+    for text in state.get("admin_notices") or []:
+        notify_admins("notice", text)  # follows the current ADMIN_NOTIFY mode
+    inline_search("")  # warm the inline index
+    log.info("♻️ State restored: %d flows, %d pending deletes (snapshot age %.1fs)",
+             len(designer_submissions), len(deletes), time.time() - state.get("saved_at", time.time()))
+
+def shutdown(signum=None, frame=None):
+    """Stop intake, drain in-flight work until SHUTDOWN_DEADLINE, snapshot state."""
+    if _stop_event.is_set():
+        return
+    _stop_event.set()  # also makes catch_up stop after its current batch
+    log.info("🛑 Shutting down (signal %s), draining up to %.0fs…", signum, SHUTDOWN_DEADLINE)
+    deadline = time.monotonic() + SHUTDOWN_DEADLINE
+    if _updater is not None:
+        # stops polling, then lets the dispatcher finish queued updates
+        t = threading.Thread(target=_updater.stop, daemon=True)
+        t.start()
+        t.join(timeout=SHUTDOWN_DEADLINE)
+    while (_inflight or _catching_up.is_set() or _notify_q.unfinished_tasks) \
+            and time.monotonic() < deadline:
+        time.sleep(0.05)
+    try:
+        save_state()
+    except (OSError, RuntimeError) as e:  # RuntimeError: a handler still mutating state
+        log.warning("Could not save state: %s", e)
+    if signum is not None:
+        raise SystemExit(0)
+
 # -------------------------
 # Long-polling (network-flaky safe)
 # -------------------------
@@ -568,27 +1152,48 @@ def _polling():
     """Start PTB polling in a side thread, robust to flaky links."""
     try:
         from telegram.ext import Updater
-        global dp
-        dp.bot.get_me(timeout=20)
-        up = Updater(TOKEN, use_context=True)
+        global dp, _updater
+        b = get_bot()
+        delay = 1
+        while not _stop_event.is_set():
+            try:
+                b.get_me(timeout=5)
+                break
+            except TelegramError as e:
+                log.warning("get_me failed (%s), retrying in %ss", e, delay)
+                _stop_event.wait(delay)
+                delay = min(delay * 2, 30)
+        if _stop_event.is_set():
+            return
+        up = _updater = Updater(bot=b, use_context=True)
         # use the Updater's dispatcher going forward
         dp = up.dispatcher
         _register_handlers(dp)
-        up.start_polling(drop_pending_updates=True, timeout=30)
-        logging.info("🔁 Polling thread started (no idle in thread)")
+        if CATCHUP_ENABLED:
+            catch_up(dp)
+        if _stop_event.is_set():
+            return
+        up.start_polling(drop_pending_updates=not CATCHUP_ENABLED, timeout=30)
+        _ready.set()
+        log.info("🔁 Polling thread started (no idle in thread)")
         # keep thread alive without idle() (signals not allowed here)
-        while True:
-            time.sleep(60)
+        _stop_event.wait()
     except Exception as e:
-        logging.warning(f"Polling thread error: {e}")
+        log.warning("Polling thread error: %s", e)
 if __name__ == "__main__":
+    if not TOKEN:
+        raise SystemExit("BOT_TOKEN missing")
+    restore_state(get_bot())
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+
     # Start long polling in background thread
     t = threading.Thread(target=_polling, daemon=True)
     t.start()
 
     from waitress import serve
-    logging.info("🚀 Emerge Assistant Bot is starting…")
-    logging.info(f"🌐 Serving Flask via waitress on 0.0.0.0:{PORT}")
+    log.info("🚀 Emerge Assistant Bot is starting…")
+    log.info("🌐 Serving Flask via waitress on 0.0.0.0:%s", PORT)
     try:
         serve(app, host="0.0.0.0", port=PORT, threads=8)
     except Exception:
@@ -0,0 +1,91 @@
+# emerge_logging.py
+# Shared logging setup for emerge_bot.py and admin_bot.py.
+# Records go through a QueueHandler; a background QueueListener does the
+# formatting and the stdout write, so request threads never block on I/O.
+# Env:
+#   LOG_LEVEL=INFO, LOG_FORMAT=text|json
+#   LOG_PAYLOAD_SAMPLE=0.1 (share of raw update dumps kept), LOG_PAYLOAD_MAX=512
+
+import os, sys, json, time, random, atexit, logging, queue
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Optional
+
+PAYLOAD_SAMPLE = float(os.environ.get("LOG_PAYLOAD_SAMPLE", "0.1"))
+PAYLOAD_MAX = int(os.environ.get("LOG_PAYLOAD_MAX", "512"))
+JSON_OUTPUT = os.environ.get("LOG_FORMAT", "text").lower() == "json"
+
+# structured fields picked up from `extra={...}`
+FIELDS = ("update_id", "chat_id", "handler", "latency_ms")
+
+_listener: Optional[QueueListener] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One compact JSON object per line."""
+    def format(self, record: logging.LogRecord) -> str:
+        out = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for k in FIELDS:
+            v = getattr(record, k, None)
+            if v is not None:
+                out[k] = v
+        if record.exc_info:
+            out["exc"] = self.formatException(record.exc_info)
+        return json.dumps(out, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class _LazyQueueHandler(QueueHandler):
+    """Enqueue the record untouched: msg % args is rendered by the listener thread."""
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class Payload:
+    """Defers str() of a (possibly large) payload and truncates it to PAYLOAD_MAX."""
+    __slots__ = ("data",)
+
+    def __init__(self, data: Any):
+        self.data = data
+
+    def __str__(self) -> str:
+        s = str(self.data)
+        if len(s) > PAYLOAD_MAX:
+            return f"{s[:PAYLOAD_MAX]}…(+{len(s) - PAYLOAD_MAX} chars)"
+        return s
+
+
+def sample_payload() -> bool:
+    """True for the share of payload dumps we keep (LOG_PAYLOAD_SAMPLE)."""
+    return PAYLOAD_SAMPLE >= 1 or random.random() < PAYLOAD_SAMPLE
+
+
+def setup_logging(fmt: str = "%(asctime)s - %(levelname)s - %(message)s"):
+    """Install the queue handler on the root logger (idempotent)."""
+    global _listener
+    if _listener is not None:
+        return
+    level = os.environ.get("LOG_LEVEL", "INFO").upper()
+    sink = logging.StreamHandler(sys.stdout)
+    if JSON_OUTPUT:
+        sink.setFormatter(JsonFormatter())
+    else:
+        sink.setFormatter(logging.Formatter(fmt))
+
+    q: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root = logging.getLogger()
+    for h in list(root.handlers):
+        root.removeHandler(h)
+    root.addHandler(_LazyQueueHandler(q))
+    root.setLevel(level)
+
+    _listener = QueueListener(q, sink, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop)  # flush what's queued on exit
+
+
+def elapsed_ms(t0: float) -> float:
+    return round((time.perf_counter() - t0) * 1000, 1)
@@ -7,8 +7,9 @@ set -a
 [ -f .env ] && . ./.env
 set +a
 
+# keep pending updates: the bot replays them on boot (catch-up)
 if [ -n "$BOT_TOKEN" ]; then
-  /usr/bin/curl -s "https://api.telegram.org/bot${BOT_TOKEN}/setWebhook" -d url= >/dev/null
+  /usr/bin/curl -s "https://api.telegram.org/bot${BOT_TOKEN}/deleteWebhook" -d drop_pending_updates=false >/dev/null
 fi
 
 exec /Users/s.w.roseburgh/n8n-docker/venv311/bin/python -u /Users/s.w.roseburgh/n8n-docker/emerge_bot.py